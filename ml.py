@@ -4,7 +4,7 @@ Handles model training, inference, and educational content recommendations
 """
 
 import numpy as np
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, NamedTuple, Union
 import json
 from datetime import datetime
 
@@ -12,13 +12,25 @@ from datetime import datetime
 class MLModel:
     """Base machine learning model for educational content"""
     
-    def __init__(self, model_name: str):
+    def __init__(self, model_name: str, num_features: int = 0):
         self.model_name = model_name
         self.is_trained = False
         self.model_params = {}
+        # Linear model: predict(X) = X @ weights + bias
+        self.weights = np.zeros(num_features)
+        self.bias = 0.0
         
     def train(self, X_train: np.ndarray, y_train: np.ndarray) -> Dict:
         """Train the model"""
+        X_train = np.asarray(X_train, dtype=np.float64)
+        y_train = np.asarray(y_train, dtype=np.float64)
+        if y_train.ndim != 1:
+            raise ValueError("y_train must be one-dimensional (one target per sample)")
+        # Least-squares fit with an appended bias column
+        design = np.hstack([X_train, np.ones((len(X_train), 1))])
+        coefficients = np.linalg.lstsq(design, y_train, rcond=None)[0]
+        self.weights = coefficients[:-1]
+        self.bias = float(coefficients[-1])
         self.is_trained = True
         return {
             "status": "success",
@@ -31,12 +43,12 @@ class MLModel:
         """Make predictions"""
         if not self.is_trained:
             raise ValueError("Model must be trained before prediction")
-        return np.random.rand(len(X_test))
+        return np.asarray(X_test, dtype=np.float64) @ self.weights + self.bias
     
     def evaluate(self, X_test: np.ndarray, y_test: np.ndarray) -> Dict:
         """Evaluate model performance"""
         predictions = self.predict(X_test)
-        accuracy = np.mean(predictions == y_test)
+        accuracy = np.mean((predictions > 0.5) == np.asarray(y_test))
         return {
             "accuracy": float(accuracy),
             "samples_tested": len(X_test),
@@ -44,15 +56,28 @@ class MLModel:
         }
 
 
+class StudentRecord(NamedTuple):
+    """Fixed-schema student learning data, a lighter alternative to a dict"""
+    # The first five fields are the model features, in model input order
+    completion_rate: float = 0.0
+    quiz_score: float = 0.0
+    time_spent: float = 0.0
+    assignment_count: float = 0.0
+    engagement_score: float = 0.0
+    student_id: Optional[str] = None
+
+
 class StudentPerformancePredictor(MLModel):
     """Predicts student performance based on learning data"""
     
     def __init__(self):
-        super().__init__("StudentPerformancePredictor")
+        super().__init__("StudentPerformancePredictor", num_features=5)
         self.feature_importance = {}
         
-    def extract_features(self, student_data: Dict) -> np.ndarray:
+    def extract_features(self, student_data: Union[Dict, StudentRecord]) -> np.ndarray:
         """Extract features from student data"""
+        if isinstance(student_data, StudentRecord):
+            return np.array(student_data[:5], dtype=np.float64)
         features = [
             student_data.get("completion_rate", 0),
             student_data.get("quiz_score", 0),
@@ -60,16 +85,21 @@ class StudentPerformancePredictor(MLModel):
             student_data.get("assignment_count", 0),
             student_data.get("engagement_score", 0)
         ]
-        return np.array(features)
+        return np.array(features, dtype=np.float64)
     
-    def predict_performance(self, student_data: Dict) -> Dict:
+    def predict_performance(self, student_data: Union[Dict, StudentRecord]) -> Dict:
         """Predict student performance"""
         features = self.extract_features(student_data)
         features = features.reshape(1, -1)
         prediction = self.predict(features)[0]
         
+        if isinstance(student_data, StudentRecord):
+            student_id = student_data.student_id
+        else:
+            student_id = student_data.get("student_id")
+        
         return {
-            "student_id": student_data.get("student_id"),
+            "student_id": student_id,
             "predicted_performance": float(prediction),
             "risk_level": "high" if prediction < 0.3 else "medium" if prediction < 0.7 else "low"
         }
@@ -78,30 +108,39 @@ class StudentPerformancePredictor(MLModel):
 class ContentRecommender(MLModel):
     """Recommends educational content based on student profiles"""
     
+    DIFFICULTIES = ("beginner", "intermediate", "advanced")
+    
     def __init__(self):
         super().__init__("ContentRecommender")
         self.content_matrix = {}
         
     def recommend_content(self, student_id: str, num_recommendations: int = 5) -> List[Dict]:
         """Recommend educational content"""
-        recommendations = [
+        scores = np.random.rand(max(num_recommendations, 0))
+        ranked = np.argsort(-scores, kind="stable").tolist()
+        scores = scores.tolist()
+        return [
             {
                 "content_id": f"content_{i}",
                 "title": f"Educational Content {i}",
-                "difficulty": ["beginner", "intermediate", "advanced"][i % 3],
-                "relevance_score": float(np.random.rand()),
+                "difficulty": self.DIFFICULTIES[i % 3],
+                "relevance_score": scores[i],
                 "estimated_duration": f"{10 + i*5} minutes"
             }
-            for i in range(num_recommendations)
+            for i in ranked
         ]
-        return sorted(recommendations, key=lambda x: x["relevance_score"], reverse=True)
 
 
 class SkillAssessment(MLModel):
     """Assesses student skills across different domains"""
     
-    def __init__(self):
+    # Lower score bound of each level after the first
+    _THRESHOLDS = np.array([30, 60, 85])
+    _LEVELS = np.array(["Beginner", "Intermediate", "Advanced", "Expert"])
+    
+    def __init__(self, seed: Optional[int] = None):
         super().__init__("SkillAssessment")
+        self._rng = np.random.default_rng(seed)
         self.skill_categories = {
             "programming": 0.0,
             "mathematics": 0.0,
@@ -112,39 +151,33 @@ class SkillAssessment(MLModel):
     
     def assess_skills(self, student_responses: List[Dict]) -> Dict:
         """Assess student skills"""
+        scores = self._rng.random(len(self.skill_categories)) * 100
+        levels = self._scores_to_levels(scores)
         assessments = {}
-        for category in self.skill_categories:
-            score = np.random.rand() * 100
+        for category, score, level in zip(self.skill_categories, scores.tolist(), levels.tolist()):
             assessments[category] = {
-                "score": float(score),
-                "level": self._score_to_level(score)
+                "score": score,
+                "level": level
             }
         return assessments
     
     def _score_to_level(self, score: float) -> str:
         """Convert score to skill level"""
-        if score < 30:
-            return "Beginner"
-        elif score < 60:
-            return "Intermediate"
-        elif score < 85:
-            return "Advanced"
-        else:
-            return "Expert"
+        return str(self._LEVELS[np.searchsorted(self._THRESHOLDS, score, side="right")])
+    
+    def _scores_to_levels(self, scores: np.ndarray) -> np.ndarray:
+        """Convert an array of scores to skill levels"""
+        return np.take(self._LEVELS, np.searchsorted(self._THRESHOLDS, scores, side="right"))
 
 
 def create_feature_matrix(student_data_list: List[Dict]) -> np.ndarray:
     """Create feature matrix from student data"""
-    features = []
-    for student in student_data_list:
-        feature_vector = [
-            student.get("attendance", 0),
-            student.get("avg_score", 0),
-            student.get("participation", 0),
-            student.get("assignments_completed", 0)
-        ]
-        features.append(feature_vector)
-    return np.array(features)
+    n = len(student_data_list)
+    columns = [
+        np.fromiter((student.get(key, 0) for student in student_data_list), dtype=np.float64, count=n)
+        for key in ("attendance", "avg_score", "participation", "assignments_completed")
+    ]
+    return np.column_stack(columns)
 
 
 if __name__ == "__main__":
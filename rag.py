@@ -4,31 +4,124 @@ Handles document retrieval, embedding, and context-aware response generation
 """
 
 from typing import List, Dict, Tuple, Optional
+from collections import OrderedDict, defaultdict, deque
+from functools import partial
+from array import array
 import json
+import math
+import string
+import sys
+import threading
+import time
 from datetime import datetime
 import hashlib
 
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib encoder
+    orjson = None
+
+
+def _jsonable(obj):
+    """Convert numpy values and non-finite floats the way orjson writes them, for the stdlib encoder"""
+    if isinstance(obj, dict):
+        return {key: _jsonable(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple, np.ndarray)):
+        return [_jsonable(value) for value in obj]
+    if isinstance(obj, np.floating):
+        # Shortest repr at the value's own precision, so float32(0.1) stays 0.1
+        obj = float(str(obj))
+    elif isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, float) and not math.isfinite(obj):
+        return None
+    return obj
+
+
+def to_json(obj) -> str:
+    """Serialize a response (or any JSON-compatible object) to a JSON string"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+    # Match orjson's compact, UTF-8 output
+    return json.dumps(_jsonable(obj), separators=(",", ":"), ensure_ascii=False)
+
+
+_iso_second = None
+_iso_timestamp = None
+
+
+def _now_iso() -> str:
+    """Current local time as an ISO-8601 string with second resolution, formatted once per second"""
+    global _iso_second, _iso_timestamp
+    second = int(time.time())
+    if second != _iso_second:
+        _iso_timestamp = datetime.fromtimestamp(second).isoformat()
+        _iso_second = second
+    return _iso_timestamp
+
+
+# Maps punctuation to spaces so tokenizing is a single translate + split
+_SPLIT_TABLE = str.maketrans(string.punctuation, " " * len(string.punctuation))
+
+
+def _tokenize(text: str) -> List[str]:
+    """Split text into lowercase word tokens, treating punctuation as whitespace"""
+    return text.translate(_SPLIT_TABLE).lower().split()
+
+
+def _top_k_rows(scores: np.ndarray, top_k: int, candidates: np.ndarray) -> np.ndarray:
+    """Rank candidate rows (given in ascending row order) by descending score and keep the top_k
+
+    Ties, including ties at the top_k cut-off, are resolved in favour of the lower row.
+    """
+    if top_k <= 0:
+        return candidates[:0]
+    if top_k < len(candidates):
+        # O(N) selection instead of sorting every candidate: keep everything above
+        # the k-th largest score, then fill with the earliest rows tied at it
+        candidate_scores = scores[candidates]
+        cutoff = np.partition(candidate_scores, len(candidates) - top_k)[len(candidates) - top_k]
+        above = candidates[candidate_scores > cutoff]
+        tied = candidates[candidate_scores == cutoff][:top_k - len(above)]
+        candidates = np.concatenate([above, tied])
+    return candidates[np.lexsort((candidates, -scores[candidates]))]
+
 
 class DocumentStore:
     """Stores and manages educational documents"""
     
     def __init__(self):
         self.documents = {}
-        self.document_index = {}
+        # Inverted index: word -> posting list of integer rows into doc_ids, kept
+        # as contiguous C ints so searches can view them as numpy arrays without copying
+        self.document_index = defaultdict(partial(array, "i"))
         self.metadata_store = {}
+        self.doc_ids = []
+        self._doc_rows = {}
+        # Guards the index so a store can be shared by several RAGSystems
+        self._lock = threading.RLock()
         
     def add_document(self, doc_id: str, content: str, metadata: Dict = None) -> str:
         """Add a document to the store"""
-        self.documents[doc_id] = content
-        self.metadata_store[doc_id] = metadata or {}
-        self.metadata_store[doc_id]["added_at"] = datetime.now().isoformat()
+        words = dict.fromkeys(map(sys.intern, _tokenize(content)))
+        metadata = metadata or {}
+        metadata["added_at"] = _now_iso()
         
-        # Create index
-        words = content.lower().split()
-        for word in set(words):
-            if word not in self.document_index:
-                self.document_index[word] = []
-            self.document_index[word].append(doc_id)
+        with self._lock:
+            self.documents[doc_id] = content
+            self.metadata_store[doc_id] = metadata
+            
+            row = self._doc_rows.get(doc_id)
+            if row is None:
+                row = len(self.doc_ids)
+                self._doc_rows[doc_id] = row
+                self.doc_ids.append(doc_id)
+            
+            # Create index
+            for word in words:
+                self.document_index[word].append(row)
         
         return doc_id
     
@@ -44,22 +137,33 @@ class DocumentStore:
     
     def search_documents(self, query: str, top_k: int = 5) -> List[Dict]:
         """Search documents based on query"""
-        query_words = query.lower().split()
-        doc_scores = {}
+        query_words = _tokenize(query)
+        if top_k <= 0:
+            return []
         
-        for word in query_words:
-            if word in self.document_index:
-                for doc_id in self.document_index[word]:
-                    doc_scores[doc_id] = doc_scores.get(doc_id, 0) + 1
+        # Hold the lock only to copy the postings out; the buffer views must be gone
+        # before another thread appends to a posting list
+        with self._lock:
+            postings = [
+                np.frombuffer(self.document_index[word], dtype=np.intc)
+                for word in query_words if word in self.document_index
+            ]
+            if not postings:
+                return []
+            postings = np.concatenate(postings)
+            num_docs = len(self.doc_ids)
         
-        ranked_docs = sorted(doc_scores.items(), key=lambda x: x[1], reverse=True)[:top_k]
+        # Score = number of query-word hits per document, counted in C
+        scores = np.bincount(postings, minlength=num_docs)
+        ranked_rows = _top_k_rows(scores, top_k, np.flatnonzero(scores))
         
         results = []
-        for doc_id, score in ranked_docs:
+        for row in ranked_rows:
+            doc_id = self.doc_ids[row]
             results.append({
                 "doc_id": doc_id,
                 "content": self.documents[doc_id][:200],
-                "score": score,
+                "score": int(scores[row]),
                 "metadata": self.metadata_store.get(doc_id, {})
             })
         
@@ -69,36 +173,151 @@ class DocumentStore:
 class EmbeddingGenerator:
     """Generates embeddings for documents and queries"""
     
-    def __init__(self, embedding_dim: int = 384):
+    def __init__(self, embedding_dim: int = 384, query_cache_size: int = 4096):
         self.embedding_dim = embedding_dim
-        self.embeddings = {}
+        # LRU cache of normalized query embeddings keyed by query text
+        self.query_cache_size = query_cache_size
+        self._query_cache = OrderedDict()
+        self.query_cache_hits = 0
+        self.query_cache_misses = 0
+        # Stored embeddings are unit-normalized rows quantized to int8 with a per-row
+        # float32 scale, in buffers grown geometrically so inserts are amortized O(dim)
+        self._codes = np.empty((16, embedding_dim), dtype=np.int8)
+        self._scales = np.empty(16, dtype=np.float32)
+        self.doc_ids = []
+        self._rows = {}
+        # Bumped on every store so dependent caches can detect stale results
+        self.version = 0
+        # Guards the buffers and query cache so a generator can be shared by several RAGSystems
+        self._lock = threading.RLock()
+    
+    # Rows dequantized per scoring step: 256 x 384 float32 is ~384 KB, small enough
+    # to stay in L2 between the upcast and the SGEMV
+    SCORE_BLOCK_ROWS = 256
+    
+    @property
+    def matrix(self) -> np.ndarray:
+        """(N, dim) dequantized copy of all stored embeddings, row i belongs to doc_ids[i]"""
+        with self._lock:
+            n, codes, scales = len(self.doc_ids), self._codes, self._scales
+        return codes[:n].astype(np.float32) * scales[:n, np.newaxis]
+    
+    def score(self, query_embedding: np.ndarray) -> np.ndarray:
+        """Dot products of a query embedding with every stored embedding"""
+        query_embedding = np.asarray(query_embedding, dtype=np.float32)
+        # Snapshot under the lock and score outside it, so readers sharing this generator
+        # run concurrently. Writers never modify rows [:n] of these buffers in place
+        # (growth and re-stores swap in new arrays), so the snapshot stays consistent.
+        with self._lock:
+            n, codes, scales = len(self.doc_ids), self._codes, self._scales
+        scores = np.empty(n, dtype=np.float32)
+        # Stream int8 codes from memory and upcast one block at a time for SGEMV
+        for start in range(0, n, self.SCORE_BLOCK_ROWS):
+            stop = min(start + self.SCORE_BLOCK_ROWS, n)
+            scores[start:stop] = codes[start:stop].astype(np.float32) @ query_embedding
+        scores *= scales[:n]
+        return scores
         
-    def generate_embedding(self, text: str) -> List[float]:
+    def generate_embedding(self, text: str) -> np.ndarray:
         """Generate embedding for text"""
-        # Simplified embedding: hash-based approach for demonstration
-        hash_obj = hashlib.md5(text.encode())
-        hash_int = int(hash_obj.hexdigest(), 16)
+        # Feature hashing: each token adds +/-1 to a hashed slot, so texts sharing
+        # tokens get correlated embeddings
+        tokens = _tokenize(text)
+        if not tokens:
+            return np.zeros(self.embedding_dim, dtype=np.float32)
         
-        embedding = []
-        for i in range(self.embedding_dim):
-            embedding.append(float((hash_int >> i) % 100) / 100.0)
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little") for token in tokens),
+            dtype=np.uint64,
+            count=len(tokens)
+        )
+        indices = (hashes % np.uint64(self.embedding_dim)).astype(np.intp)
+        signs = np.where((hashes >> np.uint64(63)) == 0, 1.0, -1.0)
+        embedding = np.bincount(indices, weights=signs, minlength=self.embedding_dim)
+        
+        return self.normalize(embedding)
+    
+    def embed_query(self, text: str) -> np.ndarray:
+        """Get the normalized embedding for a query, served from the LRU cache when possible"""
+        with self._lock:
+            embedding = self._query_cache.get(text)
+            if embedding is not None:
+                self._query_cache.move_to_end(text)
+                self.query_cache_hits += 1
+                return embedding
+            self.query_cache_misses += 1
         
+        embedding = self.generate_embedding(text)  # already unit-length
+        embedding.setflags(write=False)
+        if self.query_cache_size > 0:
+            with self._lock:
+                self._query_cache[text] = embedding
+                if len(self._query_cache) > self.query_cache_size:
+                    self._query_cache.popitem(last=False)
         return embedding
     
-    def similarity_score(self, emb1: List[float], emb2: List[float]) -> float:
+    def query_cache_stats(self) -> Dict:
+        """Get query embedding cache statistics"""
+        lookups = self.query_cache_hits + self.query_cache_misses
+        return {
+            "hits": self.query_cache_hits,
+            "misses": self.query_cache_misses,
+            "size": len(self._query_cache),
+            "max_size": self.query_cache_size,
+            "hit_rate": self.query_cache_hits / lookups if lookups else 0.0
+        }
+    
+    @staticmethod
+    def normalize(embedding: np.ndarray) -> np.ndarray:
+        """Scale embedding to unit length (zero vectors are returned unchanged)"""
+        embedding = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(embedding)
+        if norm == 0:
+            return embedding
+        return embedding / norm
+    
+    def similarity_score(self, emb1: np.ndarray, emb2: np.ndarray) -> float:
         """Calculate cosine similarity between two embeddings"""
-        dot_product = sum(a * b for a, b in zip(emb1, emb2))
-        magnitude1 = sum(a ** 2 for a in emb1) ** 0.5
-        magnitude2 = sum(b ** 2 for b in emb2) ** 0.5
-        
-        if magnitude1 == 0 or magnitude2 == 0:
-            return 0.0
+        emb1 = np.asarray(emb1, dtype=np.float32)
+        emb2 = np.asarray(emb2, dtype=np.float32)
+        return float(np.dot(emb1, emb2) / (np.linalg.norm(emb1) * np.linalg.norm(emb2) + 1e-12))
+    
+    def store_embedding(self, doc_id: str, embedding: np.ndarray, normalized: bool = False):
+        """Store normalized embedding for a document"""
+        if not normalized:
+            embedding = self.normalize(embedding)
+        peak = float(np.abs(embedding).max(initial=0.0))
+        scale = peak / 127 if peak > 0 else 1.0
+        codes = np.round(embedding / scale).astype(np.int8)
         
-        return dot_product / (magnitude1 * magnitude2)
+        with self._lock:
+            row = self._rows.get(doc_id)
+            if row is None:
+                row = len(self.doc_ids)
+                if row == len(self._codes):
+                    codes_grown = np.empty((2 * row, self.embedding_dim), dtype=np.int8)
+                    codes_grown[:row] = self._codes
+                    scales_grown = np.empty(2 * row, dtype=np.float32)
+                    scales_grown[:row] = self._scales
+                    self._codes, self._scales = codes_grown, scales_grown
+                self._rows[doc_id] = row
+                self.doc_ids.append(doc_id)
+            else:
+                # Readers score a snapshot of the buffers without the lock, so replacing
+                # an existing row writes into copies rather than in place
+                self._codes, self._scales = self._codes.copy(), self._scales.copy()
+            self._codes[row] = codes
+            self._scales[row] = scale
+            self.version += 1
     
-    def store_embedding(self, doc_id: str, embedding: List[float]):
-        """Store embedding for a document"""
-        self.embeddings[doc_id] = embedding
+    def get_embedding(self, doc_id: str) -> Optional[np.ndarray]:
+        """Get the stored (normalized, dequantized) embedding for a document"""
+        with self._lock:
+            row = self._rows.get(doc_id)
+            if row is None:
+                return None
+            codes, scales = self._codes, self._scales
+        return codes[row].astype(np.float32) * scales[row]
 
 
 class ContextRetriever:
@@ -110,24 +329,29 @@ class ContextRetriever:
         
     def retrieve_context(self, query: str, top_k: int = 3) -> List[Dict]:
         """Retrieve context for a given query"""
-        query_embedding = self.embedding_gen.generate_embedding(query)
+        if top_k <= 0 or not self.embedding_gen.doc_ids:
+            return []
         
-        # Search documents
-        search_results = self.doc_store.search_documents(query, top_k)
+        query_embedding = self.embedding_gen.embed_query(query)
+        
+        # Cosine similarity against the whole corpus (rows are pre-normalized)
+        scores = self.embedding_gen.score(query_embedding)
+        # Hashed embeddings share no features with unrelated text
+        top_rows = _top_k_rows(scores, top_k, np.flatnonzero(scores > 0))
         
         context_results = []
-        for result in search_results:
-            doc_embedding = self.embedding_gen.generate_embedding(result["content"])
-            similarity = self.embedding_gen.similarity_score(query_embedding, doc_embedding)
-            
+        for row in top_rows:
+            doc = self.doc_store.retrieve_document(self.embedding_gen.doc_ids[row])
+            if doc is None:
+                continue
             context_results.append({
-                "doc_id": result["doc_id"],
-                "content": result["content"],
-                "similarity": similarity,
-                "metadata": result["metadata"]
+                "doc_id": doc["doc_id"],
+                "content": doc["content"][:200],
+                "similarity": float(scores[row]),
+                "metadata": doc["metadata"]
             })
         
-        return sorted(context_results, key=lambda x: x["similarity"], reverse=True)
+        return context_results
 
 
 class ResponseGenerator:
@@ -156,7 +380,7 @@ class ResponseGenerator:
                 for c in context
             ],
             "student_id": student_id,
-            "generated_at": datetime.now().isoformat()
+            "generated_at": _now_iso()
         }
     
     def _build_response(self, query: str, context: List[Dict]) -> str:
@@ -174,44 +398,114 @@ class ResponseGenerator:
         return "".join(response_parts)
 
 
+class SemanticCache:
+    """Caches responses for near-duplicate queries using random-projection LSH"""
+    
+    def __init__(self, embedding_dim: int = 384, num_planes: int = 16,
+                 similarity_threshold: float = 0.95, max_bucket_size: int = 32, seed: int = 0):
+        self.similarity_threshold = similarity_threshold
+        self.max_bucket_size = max_bucket_size
+        self._planes = np.random.default_rng(seed).standard_normal((num_planes, embedding_dim)).astype(np.float32)
+        self._bit_weights = 1 << np.arange(num_planes, dtype=np.int64)
+        self._buckets = {}
+        self.hits = 0
+        self.misses = 0
+        
+    def _signature(self, embedding: np.ndarray) -> int:
+        """Hash an embedding to the side of each hyperplane it falls on"""
+        return int((self._planes @ embedding > 0) @ self._bit_weights)
+    
+    def get(self, embedding: np.ndarray) -> Optional[Dict]:
+        """Get the cached response for a similar normalized embedding, if any"""
+        for cached_embedding, response in reversed(self._buckets.get(self._signature(embedding), ())):
+            if float(cached_embedding @ embedding) >= self.similarity_threshold:
+                self.hits += 1
+                return response
+        self.misses += 1
+        return None
+    
+    def put(self, embedding: np.ndarray, response: Dict):
+        """Cache a response under its normalized query embedding"""
+        bucket = self._buckets.setdefault(self._signature(embedding), [])
+        bucket.append((embedding, response))
+        if len(bucket) > self.max_bucket_size:
+            del bucket[0]
+    
+    def clear(self):
+        """Drop all cached responses"""
+        self._buckets.clear()
+
+
+# Shared by every RAGSystem that is not given its own store or generator, so
+# agents in one process index and embed the corpus only once
+_DEFAULT_DOC_STORE = DocumentStore()
+_DEFAULT_EMBEDDING_GEN = EmbeddingGenerator()
+
+
 class RAGSystem:
     """Complete Retrieval-Augmented Generation System"""
     
-    def __init__(self):
-        self.doc_store = DocumentStore()
-        self.embedding_gen = EmbeddingGenerator()
+    def __init__(self, doc_store: DocumentStore = None, embedding_gen: EmbeddingGenerator = None,
+                 similarity_threshold: float = 0.95, max_history: int = 50):
+        self.doc_store = doc_store if doc_store is not None else _DEFAULT_DOC_STORE
+        self.embedding_gen = embedding_gen if embedding_gen is not None else _DEFAULT_EMBEDDING_GEN
         self.context_retriever = ContextRetriever(self.doc_store, self.embedding_gen)
         self.response_generator = ResponseGenerator(self.context_retriever)
+        self.semantic_cache = SemanticCache(self.embedding_gen.embedding_dim,
+                                            similarity_threshold=similarity_threshold)
+        self._cache_version = self.embedding_gen.version
+        # Sliding window of the most recent turns per student
+        self.max_history = max_history
         self.conversation_history = {}
         
     def add_educational_resource(self, resource_id: str, content: str, 
                                 metadata: Dict = None) -> str:
         """Add educational resource to the RAG system"""
         doc_id = self.doc_store.add_document(resource_id, content, metadata)
+        # Embed once at insert time; queries reuse the stored row
         embedding = self.embedding_gen.generate_embedding(content)
-        self.embedding_gen.store_embedding(doc_id, embedding)
+        self.embedding_gen.store_embedding(doc_id, embedding, normalized=True)
         return doc_id
     
     def answer_student_query(self, query: str, student_id: str = None) -> Dict:
         """Answer a student query using RAG"""
-        response = self.response_generator.generate_response(query, student_id)
+        # Cached responses may no longer reflect the best context once any
+        # system sharing the corpus adds a resource
+        version = self.embedding_gen.version
+        if version != self._cache_version:
+            self.semantic_cache.clear()
+            self._cache_version = version
+        
+        query_embedding = self.embedding_gen.embed_query(query)
+        cacheable = bool(query_embedding.any())
+        cached = self.semantic_cache.get(query_embedding) if cacheable else None
+        if cached is not None:
+            response = dict(cached, query=query, student_id=student_id,
+                            sources=[dict(source) for source in cached["sources"]],
+                            generated_at=_now_iso())
+        else:
+            response = self.response_generator.generate_response(query, student_id)
+            # The no-context reply quotes the query, so it can't be reused for another one
+            if cacheable and response["context_used"]:
+                self.semantic_cache.put(query_embedding, dict(
+                    response, sources=[dict(source) for source in response["sources"]]))
         
         # Store in conversation history
         if student_id:
             if student_id not in self.conversation_history:
-                self.conversation_history[student_id] = []
+                self.conversation_history[student_id] = deque(maxlen=self.max_history)
             
             self.conversation_history[student_id].append({
                 "query": query,
                 "response": response,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": _now_iso()
             })
         
         return response
     
     def get_conversation_history(self, student_id: str) -> List[Dict]:
         """Get conversation history for a student"""
-        return self.conversation_history.get(student_id, [])
+        return list(self.conversation_history.get(student_id, ()))
 
 
 if __name__ == "__main__":
@@ -248,10 +542,10 @@ if __name__ == "__main__":
     query = "What are loops in Python?"
     response = rag_system.answer_student_query(query, student_id="STU001")
     print("Query:", query)
-    print("Response:", response)
+    print("Response:", to_json(response))
     
     # Get another response
     query2 = "Explain functions"
     response2 = rag_system.answer_student_query(query2, student_id="STU001")
     print("\nQuery:", query2)
-    print("Response:", response2)
+    print("Response:", to_json(response2))
@@ -0,0 +1,57 @@
+"""
+Tests for the machine learning module
+"""
+
+import unittest
+
+import numpy as np
+
+from ml import MLModel, SkillAssessment
+
+
+class SkillLevelTest(unittest.TestCase):
+    """Scores map to levels with lower-inclusive bounds at 30, 60 and 85"""
+
+    SCORES = [0, 29.9, 30, 59.9, 60, 84.9, 85, 100]
+    LEVELS = ["Beginner", "Beginner", "Intermediate", "Intermediate",
+              "Advanced", "Advanced", "Expert", "Expert"]
+
+    def test_score_to_level_boundaries(self):
+        assessor = SkillAssessment()
+        self.assertEqual([assessor._score_to_level(s) for s in self.SCORES], self.LEVELS)
+
+    def test_scores_to_levels_boundaries(self):
+        assessor = SkillAssessment()
+        self.assertEqual(assessor._scores_to_levels(np.array(self.SCORES)).tolist(), self.LEVELS)
+
+
+class MLModelTest(unittest.TestCase):
+    """MLModel is a least-squares linear model"""
+
+    def test_fits_linear_target(self):
+        rng = np.random.default_rng(0)
+        X = rng.random((50, 3))
+        weights, bias = np.array([2.0, -1.0, 0.5]), 0.25
+        model = MLModel("linear", num_features=3)
+        model.train(X, X @ weights + bias)
+        self.assertTrue(np.allclose(model.weights, weights))
+        self.assertAlmostEqual(model.bias, bias)
+        self.assertTrue(np.allclose(model.predict(X), X @ weights + bias))
+
+    def test_evaluate_thresholds_predictions_at_half(self):
+        model = MLModel("identity", num_features=1)
+        model.train(np.array([[0.0], [1.0]]), np.array([0.0, 1.0]))
+        result = model.evaluate(np.array([[0.2], [0.6], [0.9]]), np.array([0, 1, 0]))
+        self.assertAlmostEqual(result["accuracy"], 2 / 3)
+
+    def test_predict_requires_training(self):
+        with self.assertRaises(ValueError):
+            MLModel("untrained", num_features=2).predict(np.zeros((1, 2)))
+
+    def test_rejects_two_dimensional_targets(self):
+        with self.assertRaises(ValueError):
+            MLModel("linear").train(np.zeros((4, 2)), np.zeros((4, 1)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,174 @@
+"""
+Tests for the RAG module
+"""
+
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import rag
+from rag import ContextRetriever, DocumentStore, EmbeddingGenerator, RAGSystem, _top_k_rows, to_json
+
+
+def _isolated_rag(**kwargs) -> RAGSystem:
+    """A RAGSystem with its own store and generator, so tests don't share corpus state"""
+    return RAGSystem(DocumentStore(), EmbeddingGenerator(), **kwargs)
+
+
+class QueryCacheTest(unittest.TestCase):
+    """The query embedding cache evicts least-recently-used entries"""
+
+    def test_evicts_least_recently_used(self):
+        embedding_gen = EmbeddingGenerator(query_cache_size=2)
+        embedding_gen.embed_query("alpha")
+        embedding_gen.embed_query("beta")
+        embedding_gen.embed_query("alpha")  # alpha is now the most recent entry
+        embedding_gen.embed_query("gamma")  # evicts beta
+        self.assertEqual(embedding_gen.query_cache_stats()["size"], 2)
+
+        embedding_gen.embed_query("alpha")
+        self.assertEqual(embedding_gen.query_cache_hits, 2)
+        embedding_gen.embed_query("beta")
+        self.assertEqual(embedding_gen.query_cache_misses, 4)
+
+    def test_cached_embedding_matches_uncached(self):
+        embedding_gen = EmbeddingGenerator()
+        first = embedding_gen.embed_query("python loops")
+        second = embedding_gen.embed_query("python loops")
+        self.assertIs(first, second)
+        expected = embedding_gen.normalize(embedding_gen.generate_embedding("python loops"))
+        self.assertTrue(np.allclose(first, expected))
+
+    def test_zero_size_disables_cache(self):
+        embedding_gen = EmbeddingGenerator(query_cache_size=0)
+        embedding_gen.embed_query("alpha")
+        embedding_gen.embed_query("alpha")
+        stats = embedding_gen.query_cache_stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["size"]), (0, 2, 0))
+
+
+class TopKTest(unittest.TestCase):
+    """Top-k selection keeps the earliest rows among ties, including ties at the cut-off"""
+
+    def test_matches_full_sort_on_random_ties(self):
+        rng = np.random.default_rng(0)
+        for _ in range(2000):
+            n = int(rng.integers(1, 40))
+            scores = rng.integers(0, 5, n).astype(np.float64)
+            top_k = int(rng.integers(0, n + 2))
+            candidates = np.flatnonzero(scores)
+            expected = sorted(candidates.tolist(), key=lambda row: (-scores[row], row))[:top_k]
+            self.assertEqual(_top_k_rows(scores, top_k, candidates).tolist(), expected)
+
+    def test_search_documents_keeps_insertion_order_at_cutoff(self):
+        store = DocumentStore()
+        for i in range(60):
+            store.add_document(f"d{i}", f"python topic{i}" + (" loops" if i % 7 == 3 else ""))
+        results = store.search_documents("python loops", 15)
+        self.assertEqual(
+            [r["doc_id"] for r in results],
+            ["d3", "d10", "d17", "d24", "d31", "d38", "d45", "d52", "d59",
+             "d0", "d1", "d2", "d4", "d5", "d6"]
+        )
+
+    def test_retrieve_context_keeps_insertion_order_at_cutoff(self):
+        store = DocumentStore()
+        embedding_gen = EmbeddingGenerator()
+        for i in range(10):
+            content = "python loops"
+            store.add_document(f"d{i}", content)
+            embedding_gen.store_embedding(f"d{i}", embedding_gen.generate_embedding(content))
+        context = ContextRetriever(store, embedding_gen).retrieve_context("python loops", top_k=3)
+        self.assertEqual([c["doc_id"] for c in context], ["d0", "d1", "d2"])
+
+
+class SemanticCacheTest(unittest.TestCase):
+    """Cached answers must not leak the original query or share mutable state"""
+
+    def setUp(self):
+        self.rag = _isolated_rag()
+        self.rag.add_educational_resource("loops", "python loops")
+
+    def test_no_context_response_quotes_current_query(self):
+        self.rag.answer_student_query("Quantum Physics")
+        response = self.rag.answer_student_query("quantum physics")
+        self.assertEqual(response["response"], "I couldn't find relevant information about: quantum physics")
+
+    def test_hit_copies_sources(self):
+        first = self.rag.answer_student_query("python loops")
+        second = self.rag.answer_student_query("Python loops")
+        self.assertEqual(self.rag.semantic_cache.hits, 1)
+        self.assertEqual(second["query"], "Python loops")
+        self.assertEqual(second["sources"], first["sources"])
+        self.assertIsNot(second["sources"], first["sources"])
+        self.assertIsNot(second["sources"][0], first["sources"][0])
+
+
+class ConversationHistoryTest(unittest.TestCase):
+    """Conversation history keeps only the most recent max_history turns per student"""
+
+    def test_history_is_capped(self):
+        rag = _isolated_rag(max_history=2)
+        rag.add_educational_resource("loops", "python loops")
+        for query in ("first", "second", "third"):
+            rag.answer_student_query(query, student_id="STU001")
+        self.assertEqual([turn["query"] for turn in rag.get_conversation_history("STU001")],
+                         ["second", "third"])
+        self.assertEqual(rag.get_conversation_history("STU002"), [])
+
+
+class ToJsonTest(unittest.TestCase):
+    """to_json writes numpy values and non-finite floats the same way with either backend"""
+
+    VALUES = {
+        "score": np.float32(0.1),
+        "rows": np.array([0.1, np.inf], dtype=np.float32),
+        "count": np.int64(2),
+        "missing": float("nan"),
+    }
+    EXPECTED = '{"score":0.1,"rows":[0.1,null],"count":2,"missing":null}'
+
+    @unittest.skipIf(rag.orjson is None, "orjson is not installed")
+    def test_orjson_backend(self):
+        self.assertEqual(to_json(self.VALUES), self.EXPECTED)
+
+    def test_stdlib_fallback(self):
+        with mock.patch.object(rag, "orjson", None):
+            self.assertEqual(to_json(self.VALUES), self.EXPECTED)
+
+
+class SharedStateTest(unittest.TestCase):
+    """RAGSystems share corpus state by default and see each other's resources"""
+
+    def test_default_store_and_generator_are_shared(self):
+        first, second = RAGSystem(), RAGSystem()
+        self.assertIs(first.doc_store, second.doc_store)
+        self.assertIs(first.embedding_gen, second.embedding_gen)
+
+    def test_resource_added_elsewhere_invalidates_semantic_cache(self):
+        store, embedding_gen = DocumentStore(), EmbeddingGenerator()
+        writer = RAGSystem(store, embedding_gen)
+        reader = RAGSystem(store, embedding_gen)
+
+        writer.add_educational_resource("loops", "python loops")
+        response = reader.answer_student_query("python loops")
+        self.assertEqual([s["doc_id"] for s in response["sources"]], ["loops"])
+
+        writer.add_educational_resource("loops_guide", "python loops guide")
+        response = reader.answer_student_query("python loops")
+        self.assertEqual(reader.semantic_cache.hits, 0)
+        self.assertEqual([s["doc_id"] for s in response["sources"]], ["loops", "loops_guide"])
+
+    def test_restored_row_does_not_change_earlier_snapshot(self):
+        embedding_gen = EmbeddingGenerator()
+        embedding_gen.store_embedding("doc", embedding_gen.generate_embedding("python loops"))
+        codes, scales = embedding_gen._codes, embedding_gen._scales
+        before = codes[0].astype(np.float32) * scales[0]
+        embedding_gen.store_embedding("doc", embedding_gen.generate_embedding("history essay"))
+        self.assertTrue(np.array_equal(codes[0].astype(np.float32) * scales[0], before))
+        self.assertFalse(np.allclose(embedding_gen.get_embedding("doc"), before))
+
+
+if __name__ == "__main__":
+    unittest.main()